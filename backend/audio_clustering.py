@@ -6,59 +6,153 @@ Performs HDBSCAN clustering and UMAP dimensionality reduction on audio features
 
 import os
 import sys
+import math
 import json
 import argparse
+
+# Numba settings must be in place before numba (or UMAP/fast_hdbscan) is imported.
+# An on-disk cache lets each new process reuse already compiled kernels. It is
+# per-user (cached kernels are unpickled on load, so never a shared directory)
+if 'NUMBA_CACHE_DIR' not in os.environ:
+    _cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    os.environ['NUMBA_CACHE_DIR'] = os.path.join(_cache_home, 'chatak', 'numba')
+    try:
+        os.makedirs(os.environ['NUMBA_CACHE_DIR'], mode=0o700, exist_ok=True)
+    except OSError:
+        pass
+os.environ.setdefault('NUMBA_NUM_THREADS', str(os.cpu_count() or 1))
+
 import numpy as np
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
 import hdbscan
-import umap
 
-def extract_feature_vector(features_dict):
-    """
-    Extract numerical feature vector from features dictionary
-    """
-    feature_vector = []
-    
+from json_output import write_json
+
+try:
+    # Numba-parallel HDBSCAN, used for larger datasets when installed
+    import fast_hdbscan
+except ImportError:
+    fast_hdbscan = None
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+# Dataset size from which clustering switches to fast_hdbscan
+FAST_HDBSCAN_MIN_POINTS = 50
+
+# Largest dataset clustered from a precomputed N x N distance matrix
+PRECOMPUTED_MAX_POINTS = 4000
+
+# Dataset size from which the visualisation embedding uses UMAP instead of PCA
+UMAP_MIN_POINTS = 10
+
+# Dataset size from which UMAP runs unseeded and in parallel
+UMAP_PARALLEL_MIN_POINTS = 50
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def pairwise_euclidean(X, D):
+        """
+        Fill D with the pairwise euclidean distances between the rows of X
+        """
+        n, d = X.shape
+        for i in numba.prange(n):
+            D[i, i] = 0.0
+            for j in range(i + 1, n):
+                s = 0.0
+                for k in range(d):
+                    t = X[i, k] - X[j, k]
+                    s += t * t
+                D[i, j] = D[j, i] = math.sqrt(s)
+
+# Fixed feature vector layout: (feature name, number of values)
+FEATURE_LAYOUT = [
     # MFCC features
-    if 'mfcc_mean' in features_dict:
-        feature_vector.extend(features_dict['mfcc_mean'])
-        feature_vector.extend(features_dict['mfcc_std'])
-    
+    ('mfcc_mean', 13), ('mfcc_std', 13),
     # Spectral features
-    spectral_features = [
-        'spectral_centroid_mean', 'spectral_centroid_std',
-        'spectral_bandwidth_mean', 'spectral_bandwidth_std',
-        'spectral_rolloff_mean', 'spectral_rolloff_std'
-    ]
-    for feature in spectral_features:
-        if feature in features_dict:
-            feature_vector.append(features_dict[feature])
-    
+    ('spectral_centroid_mean', 1), ('spectral_centroid_std', 1),
+    ('spectral_bandwidth_mean', 1), ('spectral_bandwidth_std', 1),
+    ('spectral_rolloff_mean', 1), ('spectral_rolloff_std', 1),
     # Rate features
-    rate_features = ['zero_crossing_rate_mean', 'zero_crossing_rate_std']
-    for feature in rate_features:
-        if feature in features_dict:
-            feature_vector.append(features_dict[feature])
-    
+    ('zero_crossing_rate_mean', 1), ('zero_crossing_rate_std', 1),
     # Energy features
-    energy_features = ['rms_mean', 'rms_std']
-    for feature in energy_features:
-        if feature in features_dict:
-            feature_vector.append(features_dict[feature])
-    
+    ('rms_mean', 1), ('rms_std', 1),
     # Chroma features
-    if 'chroma_mean' in features_dict:
-        feature_vector.extend(features_dict['chroma_mean'])
-        feature_vector.extend(features_dict['chroma_std'])
-    
+    ('chroma_mean', 12), ('chroma_std', 12),
     # Audio metadata
-    metadata_features = ['duration', 'sample_rate', 'audio_length']
-    for feature in metadata_features:
-        if feature in features_dict:
-            feature_vector.append(features_dict[feature])
+    ('duration', 1), ('sample_rate', 1), ('audio_length', 1)
+]
+
+# (feature name, start offset, end offset) for each entry of FEATURE_LAYOUT
+FEATURE_OFFSETS = []
+_offset = 0
+for _name, _size in FEATURE_LAYOUT:
+    FEATURE_OFFSETS.append((_name, _offset, _offset + _size))
+    _offset += _size
+FEATURE_DIM = _offset
+
+def fill_row(row_view, features_dict):
+    """
+    Fill one row of the feature matrix from a features dictionary
+    Raises KeyError/ValueError if a feature is missing or has the wrong length
+    """
+    for name, start, end in FEATURE_OFFSETS:
+        row_view[start:end] = features_dict[name]
+
+def pca_embedding(X_scaled):
+    """
+    2D PCA embedding of the scaled feature matrix (used instead of UMAP for tiny datasets)
+    """
+    Xc = X_scaled - X_scaled.mean(axis=0)
+    U, S, Vt = np.linalg.svd(Xc, full_matrices=False)
+    
+    # Fewer than 2 components exist for a single sample; keep 2 output columns
+    k = min(2, len(S))
+    embeddings = np.zeros((len(X_scaled), 2), dtype=np.float32)
+    embeddings[:, :k] = U[:, :k] * S[:k]
+    return embeddings
+
+def umap_embedding(X_scaled):
+    """
+    2D UMAP embedding of the scaled feature matrix
+    """
+    # Imported lazily: loading UMAP (and Numba) is slow and not needed for tiny datasets
+    import umap
     
-    return np.array(feature_vector, dtype=float)
+    n_samples = len(X_scaled)
+    n_neighbors = 15
+    min_dist = 0.1
+    
+    # Ensure n_neighbors is valid (must be < N)
+    n_neighbors = min(n_neighbors, n_samples - 1)
+    n_neighbors = max(1, n_neighbors)  # At least 1
+    
+    print(f"[DEBUG] Final UMAP parameters: n_neighbors={n_neighbors}, min_dist={min_dist}, dataset_size={n_samples}", file=sys.stderr)
+    
+    if n_samples >= UMAP_PARALLEL_MIN_POINTS:
+        # Larger datasets: no seed, so UMAP can run its parallel Numba path
+        reducer = umap.UMAP(
+            n_neighbors=n_neighbors,  # Dynamic number of neighbors
+            min_dist=min_dist,        # Dynamic minimum distance
+            n_components=2,           # Output dimensions
+            metric='euclidean',       # Distance metric
+            init='pca',               # Cheap initialisation from the scaled matrix
+            low_memory=True,          # Lower peak memory for the k-NN search
+            n_jobs=-1                 # Use all cores
+        )
+    else:
+        reducer = umap.UMAP(
+            n_neighbors=n_neighbors,  # Dynamic number of neighbors
+            min_dist=min_dist,        # Dynamic minimum distance
+            n_components=2,           # Output dimensions
+            metric='euclidean',       # Distance metric
+            low_memory=True,          # Lower peak memory for the k-NN search
+            random_state=42           # For reproducibility
+        )
+    
+    return reducer.fit_transform(X_scaled)
 
 def perform_clustering(features_data):
     """
@@ -66,60 +160,61 @@ def perform_clustering(features_data):
     """
 
     
-    # Extract feature vectors
-    feature_vectors = []
-    valid_indices = []
+    # Fill the feature matrix directly, one row per snippet
+    X = np.empty((len(features_data), FEATURE_DIM), dtype=np.float32)
+    filled = np.zeros(len(features_data), dtype=bool)
     
     for i, feature_data in enumerate(features_data):
         try:
-            feature_vector = extract_feature_vector(feature_data['features'])
-            
-            # Check for NaN or infinite values
-            if not np.any(np.isnan(feature_vector)) and not np.any(np.isinf(feature_vector)):
-                feature_vectors.append(feature_vector)
-                valid_indices.append(i)
-            else:
-                print(f"[WARNING] Invalid features for snippet {feature_data['id']}, skipping")
-                
+            fill_row(X[i], feature_data['features'])
+            filled[i] = True
         except Exception as e:
-            print(f"[WARNING] Failed to extract features for snippet {feature_data['id']}: {e}")
+            print(f"[WARNING] Failed to extract features for snippet {feature_data['id']}: {e}", file=sys.stderr)
             continue
     
-    if len(feature_vectors) == 0:
+    # Check for NaN or infinite values
+    valid = filled & np.isfinite(X).all(axis=1)
+    for i in np.flatnonzero(filled & ~valid):
+        print(f"[WARNING] Invalid features for snippet {features_data[i]['id']}, skipping", file=sys.stderr)
+    
+    valid_indices = np.flatnonzero(valid)
+    X = X[valid]
+    n_samples = len(X)
+    
+    if n_samples == 0:
         raise ValueError("No valid feature vectors found")
     
 
     
-    # Convert to numpy array
-    X = np.array(feature_vectors)
-    
-    # Normalize features
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Normalize features (zero mean, unit variance) in float32
+    mu = X.mean(axis=0)
+    sd = X.std(axis=0)
+    sd[sd == 0] = 1
+    X_scaled = ((X - mu) / sd).astype(np.float32, copy=False)
     
 
     
     # Perform HDBSCAN clustering
     
     # Adjust parameters for small datasets
-    if len(feature_vectors) <= 10:
+    if n_samples <= 10:
         # For small datasets (≤10), use very lenient parameters
-        min_cluster_size = max(2, len(feature_vectors) // 3)  # Allow smaller clusters
+        min_cluster_size = max(2, n_samples // 3)  # Allow smaller clusters
         min_samples = 1  # Single point can be core
-        print(f"[DEBUG] Small dataset detected: {len(feature_vectors)} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
-    elif len(feature_vectors) < 20:
+        print(f"[DEBUG] Small dataset detected: {n_samples} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
+    elif n_samples < 20:
         # For medium datasets, use moderate parameters
         min_cluster_size = 3
         min_samples = 2
-        print(f"[DEBUG] Medium dataset detected: {len(feature_vectors)} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
+        print(f"[DEBUG] Medium dataset detected: {n_samples} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
     else:
         # For larger datasets, use standard parameters
         min_cluster_size = 3
         min_samples = 2
-        print(f"[DEBUG] Large dataset detected: {len(feature_vectors)} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
+        print(f"[DEBUG] Large dataset detected: {n_samples} samples, using min_cluster_size={min_cluster_size}, min_samples={min_samples}", file=sys.stderr)
     
     # Additional parameters for small datasets
-    if len(feature_vectors) <= 10:
+    if n_samples <= 10:
         # More lenient clustering for small datasets
         cluster_selection_epsilon = 0.3  # Higher epsilon = more lenient
         alpha = 0.5  # Lower alpha = less strict outlier detection
@@ -130,16 +225,40 @@ def perform_clustering(features_data):
         alpha = 1.0
         print(f"[DEBUG] Using standard parameters: epsilon={cluster_selection_epsilon}, alpha={alpha}", file=sys.stderr)
     
-    clusterer = hdbscan.HDBSCAN(
-        min_cluster_size=min_cluster_size,  # Dynamic minimum cluster size
-        min_samples=min_samples,            # Dynamic minimum samples
-        metric='euclidean',                 # Distance metric
-        cluster_selection_method='eom',     # Excess of Mass
-        cluster_selection_epsilon=cluster_selection_epsilon,  # Dynamic epsilon
-        alpha=alpha                         # Dynamic alpha
-    )
-    
-    cluster_labels = clusterer.fit_predict(X_scaled)
+    if numba is not None and n_samples <= PRECOMPUTED_MAX_POINTS:
+        # Small/medium datasets: cluster a precomputed distance matrix
+        print(f"[DEBUG] Using precomputed distances for {n_samples} samples", file=sys.stderr)
+        D = np.empty((n_samples, n_samples), dtype=np.float64)
+        pairwise_euclidean(X_scaled, D)
+        clusterer = hdbscan.HDBSCAN(
+            min_cluster_size=min_cluster_size,  # Dynamic minimum cluster size
+            min_samples=min_samples,            # Dynamic minimum samples
+            metric='precomputed',               # Euclidean distances from D
+            cluster_selection_method='eom',     # Excess of Mass
+            cluster_selection_epsilon=cluster_selection_epsilon,  # Dynamic epsilon
+            alpha=alpha                         # Dynamic alpha
+        )
+        cluster_labels = clusterer.fit_predict(D)
+    elif fast_hdbscan is not None and n_samples >= FAST_HDBSCAN_MIN_POINTS:
+        # Multicore HDBSCAN for larger datasets (no alpha support)
+        print(f"[DEBUG] Using fast_hdbscan for {n_samples} samples", file=sys.stderr)
+        clusterer = fast_hdbscan.HDBSCAN(
+            min_cluster_size=min_cluster_size,  # Dynamic minimum cluster size
+            min_samples=min_samples,            # Dynamic minimum samples
+            cluster_selection_method='eom',     # Excess of Mass
+            cluster_selection_epsilon=cluster_selection_epsilon  # Dynamic epsilon
+        )
+        cluster_labels = clusterer.fit_predict(X_scaled)
+    else:
+        clusterer = hdbscan.HDBSCAN(
+            min_cluster_size=min_cluster_size,  # Dynamic minimum cluster size
+            min_samples=min_samples,            # Dynamic minimum samples
+            metric='euclidean',                 # Distance metric
+            cluster_selection_method='eom',     # Excess of Mass
+            cluster_selection_epsilon=cluster_selection_epsilon,  # Dynamic epsilon
+            alpha=alpha                         # Dynamic alpha
+        )
+        cluster_labels = clusterer.fit_predict(X_scaled)
     
     # Get unique cluster labels (excluding noise: -1)
     unique_labels = set(cluster_labels)
@@ -148,55 +267,33 @@ def perform_clustering(features_data):
     
 
     
-    # Calculate cluster centers for non-noise clusters
+    # Calculate cluster centers for non-noise clusters in one pass
     cluster_centers = []
-    for label in sorted(unique_labels):
-        if label != -1:
-            cluster_mask = cluster_labels == label
-            cluster_center = np.mean(X_scaled[cluster_mask], axis=0)
-            cluster_centers.append(cluster_center.tolist())
-    
-    # Perform UMAP dimensionality reduction for visualization
-    
-    # Adjust UMAP parameters for small datasets
-    if len(feature_vectors) < 5:
-        # For very small datasets, use minimal parameters
-        n_neighbors = max(1, len(feature_vectors) - 1)  # Must be < N
-        min_dist = 0.5  # Higher min_dist for small datasets
-        print(f"[DEBUG] UMAP: Small dataset, using n_neighbors={n_neighbors}, min_dist={min_dist}", file=sys.stderr)
-    elif len(feature_vectors) < 10:
-        # For medium datasets
-        n_neighbors = min(5, len(feature_vectors) - 1)
-        min_dist = 0.3
-        print(f"[DEBUG] UMAP: Medium dataset, using n_neighbors={n_neighbors}, min_dist={min_dist}", file=sys.stderr)
+    if unique_labels:
+        mask = cluster_labels != -1
+        lbl = cluster_labels[mask]
+        data = X_scaled[mask]
+        K = lbl.max() + 1
+        sums = np.zeros((K, data.shape[1]), dtype=data.dtype)
+        np.add.at(sums, lbl, data)
+        counts = np.bincount(lbl, minlength=K)[:, None]
+        sorted_labels = sorted(unique_labels)
+        cluster_centers = sums[sorted_labels] / counts[sorted_labels]
+    
+    # Perform dimensionality reduction for visualization
+    if n_samples < UMAP_MIN_POINTS:
+        # Too few points for a meaningful UMAP layout; PCA skips UMAP's JIT start-up
+        print(f"[DEBUG] Small dataset, using PCA embedding for {n_samples} samples", file=sys.stderr)
+        umap_embeddings = pca_embedding(X_scaled)
     else:
-        # For larger datasets
-        n_neighbors = 15
-        min_dist = 0.1
-        print(f"[DEBUG] UMAP: Standard dataset, using n_neighbors={n_neighbors}, min_dist={min_dist}", file=sys.stderr)
-    
-    # Ensure n_neighbors is valid (must be < N)
-    n_neighbors = min(n_neighbors, len(feature_vectors) - 1)
-    n_neighbors = max(1, n_neighbors)  # At least 1
-    
-    print(f"[DEBUG] Final UMAP parameters: n_neighbors={n_neighbors}, min_dist={min_dist}, dataset_size={len(feature_vectors)}", file=sys.stderr)
-    
-    reducer = umap.UMAP(
-        n_neighbors=n_neighbors,  # Dynamic number of neighbors
-        min_dist=min_dist,        # Dynamic minimum distance
-        n_components=2,           # Output dimensions
-        metric='euclidean',       # Distance metric
-        random_state=42           # For reproducibility
-    )
-    
-    umap_embeddings = reducer.fit_transform(X_scaled)
+        umap_embeddings = umap_embedding(X_scaled)
     
 
     
     # Prepare results
     results = {
-        'cluster_labels': cluster_labels.tolist(),
-        'umap_embeddings': umap_embeddings.tolist(),
+        'cluster_labels': cluster_labels,
+        'umap_embeddings': umap_embeddings,
         'cluster_centers': cluster_centers,
         'valid_indices': valid_indices,
         'total_clusters': len(unique_labels),
@@ -226,10 +323,9 @@ def main():
         
         # Output results
         if args.output == 'stdout':
-            print(json.dumps(results))
+            write_json(results)
         else:
-            with open(args.output, 'w') as f:
-                json.dump(results, f, indent=2)
+            write_json(results, args.output)
             print(f"[SUCCESS] Clustering results saved to: {args.output}")
             
     except Exception as e:
@@ -8,86 +8,197 @@ import os
 import sys
 import json
 import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import librosa
+import scipy.fft
+from scipy.signal import resample_poly
 
-def extract_audio_features(audio_path):
+from audio_io import read_audio
+from fft_backend import configure_fft_backend, set_fft_workers, stft_power
+from json_output import write_json
+
+configure_fft_backend()
+
+# Sample rate all features are computed at
+TARGET_SR = 22050
+
+# STFT parameters shared by all spectral features
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Mel bands and number of MFCCs kept from them
+N_MELS = 128
+N_MFCC = 13
+
+# Orthonormal DCT-II rows, so mfcc = DCT_BASIS @ log-mel
+DCT_BASIS = scipy.fft.dct(np.eye(N_MELS), type=2, norm='ortho', axis=0)[:N_MFCC].astype(np.float32)
+
+@lru_cache(maxsize=32)
+def mel_basis(sr, n_fft=N_FFT, n_mels=N_MELS, fmin=0.0, fmax=None):
+    """Mel filter bank, built once per parameter set instead of on every snippet"""
+    return librosa.filters.mel(sr=sr, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax).astype(np.float32)
+
+@lru_cache(maxsize=None)
+def chroma_basis(sr, tuning, n_fft=N_FFT):
+    """Chroma filter bank, built once per sample rate and tuning"""
+    return librosa.filters.chroma(sr=sr, n_fft=n_fft, tuning=tuning).astype(np.float32)
+
+def load_audio(audio_path, sr=TARGET_SR):
     """
-    Extract audio features from audio file
-    Focuses on features relevant for bird call clustering
+    Load audio file as a mono float32 signal at the given sample rate
     """
-    try:
-        # Load audio file
-        y, sr = librosa.load(audio_path, sr=22050)
-        
-        # Ensure audio is mono
-        if len(y.shape) > 1:
-            y = np.mean(y, axis=1)
-        
-        # Extract MFCCs (Mel-frequency cepstral coefficients)
-        mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=13, hop_length=512)
-        mfcc_mean = np.mean(mfcc, axis=1)
-        mfcc_std = np.std(mfcc, axis=1)
+    data, file_sr = read_audio(audio_path)
+    
+    if file_sr != sr:
+        data = resample_poly(data, sr, file_sr).astype(np.float32, copy=False)
+    
+    return data, sr
+
+def zero_crossing_rate(y, frame_length=N_FFT, hop_length=HOP_LENGTH, threshold=1e-10):
+    """
+    Framewise zero crossing rate, equal to librosa.feature.zero_crossing_rate
+    (centered, edge padded), from one sign pass and a cumulative sum over the
+    whole signal instead of per-frame counting
+    """
+    half = frame_length // 2
+    y = np.pad(y, (half, half), mode='edge')
+    
+    # Samples within threshold of zero count as positive
+    signs = np.signbit(y) & (np.abs(y) > threshold)
+    crossings = np.concatenate(([0], np.cumsum(signs[1:] != signs[:-1])))
+    
+    # Crossings strictly inside each frame (its first sample is not counted)
+    starts = np.arange(1 + (len(y) - frame_length) // hop_length) * hop_length
+    return (crossings[starts + frame_length - 1] - crossings[starts]) / frame_length
+
+def compute_features(y, sr, S_power=None):
+    """
+    Compute clustering features for a mono float32 audio signal
+    
+    Args:
+        y (np.ndarray): Audio time series
+        sr (int): Sample rate of y
+        S_power (np.ndarray): Optional precomputed power STFT of y
+                              (N_FFT/HOP_LENGTH frames); computed if None
+    """
+    # Compute the power STFT once and share it across all spectral features;
+    # the magnitude is only needed by the centroid/bandwidth/rolloff features
+    if S_power is None:
+        S_power = stft_power(y, N_FFT, HOP_LENGTH)
+    S = np.sqrt(S_power)
+    
+    # Extract MFCCs (Mel-frequency cepstral coefficients)
+    mfcc = DCT_BASIS @ librosa.power_to_db(mel_basis(sr) @ S_power)
+    mfcc_mean = np.mean(mfcc, axis=1)
+    mfcc_std = np.std(mfcc, axis=1)
+    
+    # Extract spectral features
+    spectral_centroid = librosa.feature.spectral_centroid(S=S, sr=sr)
+    spectral_bandwidth = librosa.feature.spectral_bandwidth(S=S, sr=sr)
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=S, sr=sr)
+    
+    # Extract zero crossing rate
+    zcr = zero_crossing_rate(y)
+    
+    # Extract energy features
+    rms = librosa.feature.rms(y=y, hop_length=HOP_LENGTH)
+    
+    # Extract pitch features (chroma)
+    # (same steps as chroma_stft, reusing the filter bank for the estimated tuning)
+    tuning = float(librosa.estimate_tuning(S=S_power, sr=sr, bins_per_octave=12))
+    chroma = librosa.util.normalize(chroma_basis(sr, tuning) @ S_power, norm=np.inf, axis=-2)
+    
+    # Combine all features into a single vector
+    return {
+        # MFCC features
+        'mfcc_mean': mfcc_mean,
+        'mfcc_std': mfcc_std,
         
-        # Extract spectral features
-        spectral_centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=512)
-        spectral_bandwidth = librosa.feature.spectral_bandwidth(y=y, sr=sr, hop_length=512)
-        spectral_rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, hop_length=512)
+        # Spectral features
+        'spectral_centroid_mean': float(np.mean(spectral_centroid)),
+        'spectral_centroid_std': float(np.std(spectral_centroid)),
+        'spectral_bandwidth_mean': float(np.mean(spectral_bandwidth)),
+        'spectral_bandwidth_std': float(np.std(spectral_bandwidth)),
+        'spectral_rolloff_mean': float(np.mean(spectral_rolloff)),
+        'spectral_rolloff_std': float(np.std(spectral_rolloff)),
         
-        # Extract zero crossing rate
-        zero_crossing_rate = librosa.feature.zero_crossing_rate(y, hop_length=512)
+        # Rate features
+        'zero_crossing_rate_mean': float(np.mean(zcr)),
+        'zero_crossing_rate_std': float(np.std(zcr)),
         
-        # Extract energy features
-        rms = librosa.feature.rms(y=y, hop_length=512)
+        # Energy features
+        'rms_mean': float(np.mean(rms)),
+        'rms_std': float(np.std(rms)),
         
-        # Extract pitch features (chroma)
-        chroma = librosa.feature.chroma_stft(y=y, sr=sr, hop_length=512)
+        # Chroma features (pitch)
+        'chroma_mean': np.mean(chroma, axis=1),
+        'chroma_std': np.std(chroma, axis=1),
         
-        # Combine all features into a single vector
-        features = {
-            # MFCC features
-            'mfcc_mean': mfcc_mean.tolist(),
-            'mfcc_std': mfcc_std.tolist(),
-            
-            # Spectral features
-            'spectral_centroid_mean': float(np.mean(spectral_centroid)),
-            'spectral_centroid_std': float(np.std(spectral_centroid)),
-            'spectral_bandwidth_mean': float(np.mean(spectral_bandwidth)),
-            'spectral_bandwidth_std': float(np.std(spectral_bandwidth)),
-            'spectral_rolloff_mean': float(np.mean(spectral_rolloff)),
-            'spectral_rolloff_std': float(np.std(spectral_rolloff)),
-            
-            # Rate features
-            'zero_crossing_rate_mean': float(np.mean(zero_crossing_rate)),
-            'zero_crossing_rate_std': float(np.std(zero_crossing_rate)),
-            
-            # Energy features
-            'rms_mean': float(np.mean(rms)),
-            'rms_std': float(np.std(rms)),
-            
-            # Chroma features (pitch)
-            'chroma_mean': np.mean(chroma, axis=1).tolist(),
-            'chroma_std': np.std(chroma, axis=1).tolist(),
-            
-            # Audio metadata
-            'duration': float(librosa.get_duration(y=y, sr=sr)),
-            'sample_rate': int(sr),
-            'audio_length': len(y)
-        }
+        # Audio metadata
+        'duration': float(librosa.get_duration(y=y, sr=sr)),
+        'sample_rate': int(sr),
+        'audio_length': len(y)
+    }
+
+def extract_audio_features(audio_path):
+    """
+    Extract audio features from audio file
+    Focuses on features relevant for bird call clustering
+    """
+    try:
+        # Load audio file
+        y, sr = load_audio(audio_path)
+        y = np.ascontiguousarray(y, dtype=np.float32)
         
-        return features
+        return compute_features(y, sr)
         
     except Exception as e:
         print(f"[ERROR] Feature extraction failed: {str(e)}", file=sys.stderr)
         return None
 
+def extract_features_batch(audio_paths):
+    """
+    Extract audio features for a list of audio files in parallel
+    Returns one features dict (or None on failure) per path, in input order
+    """
+    if not audio_paths:
+        return []
+    
+    # One FFT thread per worker process; the pool already uses every core
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=set_fft_workers, initargs=(1,)) as executor:
+        return list(executor.map(extract_audio_features, audio_paths, chunksize=4))
+
 def main():
     parser = argparse.ArgumentParser(description='Extract audio features from audio file')
-    parser.add_argument('--audio', required=True, help='Path to audio file')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--audio', help='Path to audio file')
+    source.add_argument('--audio-list', help='Path to JSON file containing a list of audio file paths')
     parser.add_argument('--output', default='stdout', help='Output method (stdout or file path)')
     
     args = parser.parse_args()
     
+    if args.audio_list:
+        try:
+            with open(args.audio_list, 'r') as f:
+                audio_paths = json.load(f)
+            
+            # Extract features for all files in one process pool
+            results = extract_features_batch(audio_paths)
+            
+            # Output features (one entry per input path, null on failure)
+            if args.output == 'stdout':
+                write_json(results)
+            else:
+                write_json(results, args.output)
+                print(f"[SUCCESS] Features saved to: {args.output}")
+                
+        except Exception as e:
+            print(f"[ERROR] Unexpected error: {str(e)}", file=sys.stderr)
+            sys.exit(1)
+        return
+    
     # Check if audio file exists
     if not os.path.exists(args.audio):
         print(f"[ERROR] Audio file not found: {args.audio}", file=sys.stderr)
@@ -103,10 +214,9 @@ def main():
         
         # Output features
         if args.output == 'stdout':
-            print(json.dumps(features))
+            write_json(features)
         else:
-            with open(args.output, 'w') as f:
-                json.dump(features, f, indent=2)
+            write_json(features, args.output)
             print(f"[SUCCESS] Features saved to: {args.output}")
             
     except Exception as e:
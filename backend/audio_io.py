@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Audio Decoding Helpers
+Decodes audio files to mono float32 with soundfile, falling back to librosa
+only for formats libsndfile cannot read. Shared by the feature extractor and
+the spectrogram generator
+"""
+
+import numpy as np
+import soundfile as sf
+
+def read_audio(audio_path, start_time=None, end_time=None):
+    """
+    Decode audio_path as mono float32 at its native sample rate
+    With start_time/end_time (seconds) only that region is read, starting at
+    sample int(start_time * sr)
+
+    Returns:
+        tuple: (samples, sample_rate)
+    """
+    try:
+        with sf.SoundFile(audio_path) as f:
+            sr = f.samplerate
+            start = min(int((start_time or 0) * sr), f.frames)
+            frames = -1 if end_time is None else max(0, int(end_time * sr) - start)
+            f.seek(start)
+            y = f.read(frames=frames, dtype='float32', always_2d=False)
+    except RuntimeError:
+        # libsndfile could not decode the format (LibsndfileError); librosa
+        # is only imported here, so the soundfile path doesn't pay for it
+        import librosa
+        y, sr = librosa.load(audio_path, sr=None, mono=True, dtype=np.float32)
+        start = int((start_time or 0) * sr)
+        return (y[start:] if end_time is None else y[start:int(end_time * sr)]), sr
+
+    if y.ndim > 1:
+        y = y.mean(axis=1, dtype=np.float32)
+
+    return y, sr
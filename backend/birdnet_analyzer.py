@@ -8,71 +8,183 @@ import os
 import sys
 import json
 import argparse
+from contextlib import redirect_stdout
 from datetime import datetime
 
-def analyze_audio_with_birdnet(audio_path, latitude, longitude, output_method='stdout'):
-    """Analyze audio file with BirdNet and output results to stdout."""
-    try:
-        # Import BirdNet libraries
-        from birdnetlib import Recording
-        from birdnetlib.analyzer import Analyzer
-        
-        print(f"[INFO] Initializing BirdNet Analyzer...")
-        analyzer = Analyzer()
-        print("[SUCCESS] BirdNet Analyzer initialized successfully!")
-        
-        print(f"[INFO] Analyzing audio file: {audio_path}")
-        print(f"[INFO] Using global species list (location filtering disabled)")
-        
-        # Create recording object WITHOUT location coordinates (global species list)
-        recording = Recording(
-            analyzer,
-            audio_path,
-            # lat=float(latitude),  # Commented out to use global species list
-            # lon=float(longitude), # Commented out to use global species list
-            date=datetime.now(),
-            min_conf=0.05  # Lower threshold to catch more events
-        )
-        
-        print("[INFO] Running BirdNet analysis...")
-        # Run analysis
-        recording.analyze()
-        print("[SUCCESS] BirdNet analysis complete!")
+# TFLite GPU delegate library; set to an empty string to force CPU inference
+GPU_DELEGATE_PATH = os.environ.get('BIRDNET_GPU_DELEGATE', 'libdelegate_gpu.so')
+
+def load_interpreter(tflite, model_path):
+    """
+    Create a TFLite interpreter for the BirdNet model, using the GPU delegate
+    when it can be loaded and all CPU cores otherwise.
+    """
+    if GPU_DELEGATE_PATH:
+        try:
+            delegate = tflite.load_delegate(GPU_DELEGATE_PATH)
+            interpreter = tflite.Interpreter(model_path=model_path, experimental_delegates=[delegate])
+            interpreter.allocate_tensors()
+            print(f"[INFO] BirdNet model running on GPU delegate: {GPU_DELEGATE_PATH}")
+            return interpreter
+        except (ValueError, OSError, RuntimeError) as e:
+            print(f"[INFO] GPU delegate not available ({e}), using CPU")
+    
+    interpreter = tflite.Interpreter(model_path=model_path, num_threads=os.cpu_count())
+    interpreter.allocate_tensors()
+    return interpreter
+
+# Number of 3-second windows sent through the model per invoke()
+INFERENCE_BATCH_SIZE = 16
+
+class CachedOutputInterpreter:
+    """
+    Stand-in for the TFLite interpreter that replays precomputed per-window
+    model outputs, in order, to Analyzer.predict.
+    """
+    
+    def __init__(self, outputs):
+        self._outputs = iter(outputs)
+        self._current = None
+    
+    def resize_tensor_input(self, *args, **kwargs):
+        pass
+    
+    def allocate_tensors(self):
+        pass
+    
+    def set_tensor(self, *args):
+        pass
+    
+    def invoke(self):
+        self._current = next(self._outputs)
+    
+    def get_tensor(self, index):
+        return self._current
+
+def create_analyzer():
+    """Create a BirdNet Analyzer (loads the model)."""
+    from birdnetlib import analyzer as birdnetlib_analyzer
+    from birdnetlib.analyzer import Analyzer
+    
+    class AcceleratedAnalyzer(Analyzer):
+        """Analyzer whose model interpreter uses the GPU delegate or all CPU cores."""
         
-        print(f"[INFO] Processing {len(recording.detections)} detections...")
+        def load_model(self):
+            if self.use_custom_classifier:
+                return super().load_model()
+            
+            self.interpreter = load_interpreter(birdnetlib_analyzer.tflite, self.model_path)
+            
+            # Get input and output tensors (same as Analyzer.load_model)
+            self.input_details = self.interpreter.get_input_details()
+            self.output_details = self.interpreter.get_output_details()
+            self.input_layer_index = self.input_details[0]["index"]
+            self.output_layer_index = self.output_details[0]["index"]
         
-        # Process and format detections
-        detections = []
-        for detection in recording.detections:
-            # Handle both object and dictionary formats
-            if hasattr(detection, 'common_name'):
-                # Object format
-                detection_data = {
-                    "species": detection.common_name,
-                    "scientific_name": detection.scientific_name,
-                    "confidence": float(detection.confidence),
-                    "start_time": float(detection.start_time),
-                    "end_time": float(detection.end_time),
-                    "duration": float(detection.end_time - detection.start_time),
-                    "start_ms": int(detection.start_time * 1000),
-                    "end_ms": int(detection.end_time * 1000)
-                }
-            else:
-                # Dictionary format
-                detection_data = {
-                    "species": detection.get('common_name', detection.get('species', 'Unknown')),
-                    "scientific_name": detection.get('scientific_name', 'Unknown'),
-                    "confidence": float(detection.get('confidence', 0)),
-                    "start_time": float(detection.get('start_time', 0)),
-                    "end_time": float(detection.get('end_time', 0)),
-                    "duration": float(detection.get('end_time', 0) - detection.get('start_time', 0)),
-                    "start_ms": int(detection.get('start_time', 0) * 1000),
-                    "end_ms": int(detection.get('end_time', 0) * 1000)
-                }
-            detections.append(detection_data)
+        def predict_windows(self, chunks):
+            """Run the model on all windows, INFERENCE_BATCH_SIZE per invoke()."""
+            import numpy as np
+            
+            outputs = []
+            for i in range(0, len(chunks), INFERENCE_BATCH_SIZE):
+                batch = np.stack(chunks[i:i + INFERENCE_BATCH_SIZE]).astype(np.float32)
+                self.interpreter.resize_tensor_input(self.input_layer_index, list(batch.shape))
+                self.interpreter.allocate_tensors()
+                self.interpreter.set_tensor(self.input_layer_index, batch)
+                self.interpreter.invoke()
+                prediction = self.interpreter.get_tensor(self.output_layer_index)
+                outputs.extend(prediction[j:j + 1].copy() for j in range(len(batch)))
+            return outputs
         
-        # Sort by confidence (highest first)
-        detections.sort(key=lambda x: x['confidence'], reverse=True)
+        def analyze_recording(self, recording):
+            chunks = getattr(recording, 'chunks', None)
+            if self.use_custom_classifier or not chunks:
+                return super().analyze_recording(recording)
+            
+            try:
+                outputs = self.predict_windows(chunks)
+            except (ValueError, RuntimeError) as e:
+                # Some delegates cannot resize the input; analyze window by window
+                print(f"[INFO] Batched inference not available ({e}), using per-window inference")
+                return super().analyze_recording(recording)
+            
+            # Let the base class do its per-window bookkeeping on the cached outputs
+            interpreter = self.interpreter
+            self.interpreter = CachedOutputInterpreter(outputs)
+            try:
+                return super().analyze_recording(recording)
+            finally:
+                self.interpreter = interpreter
+    
+    print(f"[INFO] Initializing BirdNet Analyzer...")
+    analyzer = AcceleratedAnalyzer()
+    print("[SUCCESS] BirdNet Analyzer initialized successfully!")
+    return analyzer
+
+def format_detection(detection):
+    """Convert a birdnetlib detection to the JSON format used by the backend."""
+    # Handle both object and dictionary formats
+    if hasattr(detection, 'common_name'):
+        # Object format
+        return {
+            "species": detection.common_name,
+            "scientific_name": detection.scientific_name,
+            "confidence": float(detection.confidence),
+            "start_time": float(detection.start_time),
+            "end_time": float(detection.end_time),
+            "duration": float(detection.end_time - detection.start_time),
+            "start_ms": int(detection.start_time * 1000),
+            "end_ms": int(detection.end_time * 1000)
+        }
+    else:
+        # Dictionary format
+        return {
+            "species": detection.get('common_name', detection.get('species', 'Unknown')),
+            "scientific_name": detection.get('scientific_name', 'Unknown'),
+            "confidence": float(detection.get('confidence', 0)),
+            "start_time": float(detection.get('start_time', 0)),
+            "end_time": float(detection.get('end_time', 0)),
+            "duration": float(detection.get('end_time', 0) - detection.get('start_time', 0)),
+            "start_ms": int(detection.get('start_time', 0) * 1000),
+            "end_ms": int(detection.get('end_time', 0) * 1000)
+        }
+
+def detect_birds(analyzer, audio_path):
+    """Run BirdNet on one audio file and return detections, highest confidence first."""
+    from birdnetlib import Recording
+    
+    print(f"[INFO] Analyzing audio file: {audio_path}")
+    print(f"[INFO] Using global species list (location filtering disabled)")
+    
+    # Create recording object WITHOUT location coordinates (global species list)
+    options = dict(
+        # lat=float(latitude),  # Commented out to use global species list
+        # lon=float(longitude), # Commented out to use global species list
+        date=datetime.now(),
+        min_conf=0.05  # Lower threshold to catch more events
+    )
+    recording = Recording(analyzer, audio_path, **options)
+    
+    print("[INFO] Running BirdNet analysis...")
+    # Run analysis
+    recording.analyze()
+    print("[SUCCESS] BirdNet analysis complete!")
+    
+    print(f"[INFO] Processing {len(recording.detections)} detections...")
+    
+    # Process and format detections
+    detections = [format_detection(detection) for detection in recording.detections]
+    
+    # Sort by confidence (highest first)
+    detections.sort(key=lambda x: x['confidence'], reverse=True)
+    
+    return detections
+
+def analyze_audio_with_birdnet(audio_path, latitude, longitude, output_method='stdout'):
+    """Analyze audio file with BirdNet and output results to stdout."""
+    try:
+        analyzer = create_analyzer()
+        detections = detect_birds(analyzer, audio_path)
         
         print(f"[SUCCESS] Found {len(detections)} detections")
         
@@ -106,16 +218,59 @@ def analyze_audio_with_birdnet(audio_path, latitude, longitude, output_method='s
             json.dump(error_result, f, indent=2)
         return False
 
+def serve():
+    """
+    Serve analysis requests over stdin/stdout with a single loaded Analyzer.
+    Each stdin line is {"audio": ..., "lat": ..., "lon": ...}; each stdout line
+    is {"success": true, "detections": [...]} or {"success": false, "error": ...}.
+    Progress logging goes to stderr.
+    """
+    output = sys.stdout
+    with redirect_stdout(sys.stderr):
+        analyzer = None
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                request = json.loads(line)
+                if not os.path.exists(request['audio']):
+                    raise FileNotFoundError(f"Audio file not found: {request['audio']}")
+                
+                # Load the model once, on the first request
+                if analyzer is None:
+                    analyzer = create_analyzer()
+                
+                detections = detect_birds(analyzer, request['audio'])
+                print(f"[SUCCESS] Found {len(detections)} detections")
+                result = {"success": True, "detections": detections}
+                
+            except Exception as e:
+                print(f"[ERROR] BirdNet analysis error: {e}")
+                result = {"success": False, "error": f"BirdNet analysis failed: {str(e)}"}
+            
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+
 def main():
     """Main function to handle command line arguments."""
     parser = argparse.ArgumentParser(description='BirdNet Audio Analysis')
-    parser.add_argument('--audio', required=True, help='Path to audio file')
-    parser.add_argument('--lat', required=True, help='Latitude coordinate')
-    parser.add_argument('--lon', required=True, help='Longitude coordinate')
+    parser.add_argument('--audio', help='Path to audio file')
+    parser.add_argument('--lat', help='Latitude coordinate')
+    parser.add_argument('--lon', help='Longitude coordinate')
     parser.add_argument('--output', default='stdout', help='Output method (stdout or file path)')
+    parser.add_argument('--server', action='store_true', help='Serve line-delimited JSON requests from stdin')
     
     args = parser.parse_args()
     
+    if args.server:
+        serve()
+        sys.exit(0)
+    
+    if not (args.audio and args.lat and args.lon):
+        parser.error('--audio, --lat and --lon are required unless --server is used')
+    
     # Validate inputs
     if not os.path.exists(args.audio):
         print(f"[ERROR] Audio file not found: {args.audio}")
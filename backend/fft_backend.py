@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+FFT Backend Configuration
+Routes the scipy.fft calls made by librosa through pyFFTW when it is
+installed, and runs the default scipy.fft backend with worker threads otherwise.
+Also provides the threaded rfft-based power STFT shared by the scripts
+"""
+
+import os
+import atexit
+import tempfile
+from functools import lru_cache
+import numpy as np
+import scipy.fft
+import scipy.signal
+
+try:
+    import pyfftw
+    import pyfftw.interfaces.scipy_fft
+except ImportError:
+    pyfftw = None
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+# Per-user cache directory; never a shared location such as /tmp
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'),
+    'chatak'
+)
+
+# Where FFTW plans ("wisdom") are cached between runs
+WISDOM_FILE = os.environ.get('PYFFTW_WISDOM_FILE', os.path.join(CACHE_DIR, 'fftw_wisdom'))
+
+# export_wisdom() returns one wisdom string per precision; FFTW wisdom is
+# plain text, so the strings are stored NUL-separated as raw bytes
+WISDOM_SEPARATOR = b'\0'
+
+_workers = os.cpu_count() or 1
+_configured = False
+
+def _load_wisdom():
+    """Import cached FFTW wisdom, ignoring a missing or unreadable cache"""
+    try:
+        with open(WISDOM_FILE, 'rb') as f:
+            pyfftw.import_wisdom(tuple(f.read().split(WISDOM_SEPARATOR)))
+    except Exception:
+        pass
+
+def _save_wisdom():
+    """
+    Export FFTW wisdom so later runs can skip planning
+    Written to a temporary file and renamed into place, so processes saving
+    at exit concurrently never leave a partially written cache behind
+    """
+    tmp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(WISDOM_FILE))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.fftw_wisdom.')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(WISDOM_SEPARATOR.join(pyfftw.export_wisdom()))
+        os.replace(tmp_path, WISDOM_FILE)
+    except Exception:
+        if tmp_path is not None and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def set_fft_workers(workers):
+    """
+    Set the number of threads used per transform
+    Pool workers should use 1 so processes don't oversubscribe the CPU
+    """
+    global _workers
+    _workers = max(1, int(workers))
+    if pyfftw is not None:
+        pyfftw.config.NUM_THREADS = _workers
+
+def configure_fft_backend():
+    """
+    Install pyFFTW as the global scipy.fft backend when available
+    Safe to call more than once
+    """
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    if pyfftw is None:
+        return
+
+    pyfftw.config.NUM_THREADS = _workers
+    pyfftw.interfaces.cache.enable()
+    _load_wisdom()
+    atexit.register(_save_wisdom)
+    scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+
+def fft_workers():
+    """Context manager running scipy.fft transforms with the configured thread count"""
+    return scipy.fft.set_workers(_workers)
+
+@lru_cache(maxsize=None)
+def _get_window(n_fft):
+    """Periodic Hann window for n_fft (as used by librosa.stft), built once"""
+    return scipy.signal.get_window('hann', n_fft, fftbins=True).astype(np.float32)
+
+# Upper bound on the complex rfft buffer stft_power holds at a time
+STFT_BLOCK_BYTES = 128 * 1024 * 1024
+
+def stft_power(y, n_fft, hop_length):
+    """
+    Power spectrogram |STFT|^2 of y, equal to np.abs(librosa.stft(y, n_fft=n_fft,
+    hop_length=hop_length)) ** 2 (centered, zero padded), computed with one rfft
+    per block of frames over a strided frame view and without an abs/sqrt pass.
+    Only the float32 result is full size; the complex STFT is never held at once
+    """
+    y = np.pad(np.asarray(y, dtype=np.float32), n_fft // 2, mode='constant')
+    if len(y) < n_fft:
+        y = np.pad(y, (0, n_fft - len(y)), mode='constant')
+
+    frames = np.lib.stride_tricks.sliding_window_view(y, n_fft)[::hop_length]
+    window = _get_window(n_fft)
+    n_bins = 1 + n_fft // 2
+    power = np.empty((n_bins, len(frames)), dtype=np.float32)
+
+    # complex64 spectrum plus the windowed float32 frames, per frame
+    block = max(1, STFT_BLOCK_BYTES // (n_bins * 8 + n_fft * 4))
+    with fft_workers():
+        for start in range(0, len(frames), block):
+            spec = scipy.fft.rfft(frames[start:start + block] * window, axis=1)
+            re, im = spec.real, spec.imag
+            out = power[:, start:start + len(spec)].T
+            if ne is not None:
+                ne.evaluate('re * re + im * im', out=out)
+            else:
+                np.multiply(re, re, out=out)
+                out += np.square(im)
+
+    return power
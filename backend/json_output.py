@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+JSON Output Helpers
+Serializes results containing numpy arrays with orjson when it is installed,
+falling back to ujson and then the standard json module
+"""
+
+import sys
+import numpy as np
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+import json
+
+def _to_builtin(obj):
+    """Convert numpy values the encoder can't handle natively to Python types"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps_json(obj, indent=False):
+    """Serialize obj (which may contain numpy arrays) to UTF-8 JSON bytes"""
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        # Non-contiguous arrays and unsupported dtypes go through _to_builtin
+        return orjson.dumps(obj, default=_to_builtin, option=option)
+
+    if ujson is not None:
+        return ujson.dumps(obj, default=_to_builtin, indent=2 if indent else 0).encode('utf-8')
+
+    return json.dumps(obj, default=_to_builtin, indent=2 if indent else None).encode('utf-8')
+
+def write_json(obj, path=None):
+    """
+    Write obj as JSON to path (indented) or, if no path is given, as a single
+    line to stdout
+    """
+    if path is None:
+        sys.stdout.flush()
+        sys.stdout.buffer.write(dumps_json(obj) + b'\n')
+        sys.stdout.buffer.flush()
+    else:
+        with open(path, 'wb') as f:
+            f.write(dumps_json(obj, indent=True))
@@ -1,18 +1,287 @@
 #!/usr/bin/env python3
 """
 Spectrogram Generator for Audio Events
-Generates high-quality spectrograms using librosa and matplotlib
+Generates high-quality spectrograms with a threaded numpy STFT and matplotlib
 """
 
 import argparse
-import librosa
-import librosa.display
 import matplotlib.pyplot as plt
 import matplotlib.patches as patches
+import json
 import numpy as np
 import os
 import sys
+import math
+import multiprocessing
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
 from pathlib import Path
+import soxr
+from PIL import Image
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+try:
+    import numexpr as ne
+except ImportError:
+    ne = None
+
+from audio_io import read_audio
+from fft_backend import configure_fft_backend, set_fft_workers, stft_power
+
+configure_fft_backend()
+
+# Per-job progress messages are only printed when SPEC_DEBUG is set
+SPEC_DEBUG = bool(os.environ.get('SPEC_DEBUG'))
+
+def log_info(message):
+    """Print an [INFO] progress message if SPEC_DEBUG is enabled"""
+    if SPEC_DEBUG:
+        print(f"[INFO] {message}")
+
+# Same floor as librosa.amplitude_to_db (amin=1e-5, squared for power)
+AMIN_POWER = np.float32(1e-10)
+
+if numba is not None:
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _power_to_db_kernel(power, amin, ref_db, top_db, out):
+        """Fused floor, log, reference and clip: one read and one write per cell"""
+        for i in numba.prange(power.shape[0]):
+            for j in range(power.shape[1]):
+                v = 10.0 * math.log10(max(power[i, j], amin)) - ref_db
+                out[i, j] = min(max(v, -top_db), 0.0)
+
+# Downsampled rate must stay above 2*fmax times this, keeping fmax inside soxr's passband
+RESAMPLE_HEADROOM = 1.1
+
+# Fast zlib level for PNG output: images are written once and served as-is
+PNG_COMPRESS_LEVEL = 1
+
+def power_to_db(power, top_db=80.0, out=None, ref_power=None):
+    """
+    Convert a power spectrogram to dB relative to its maximum (or ref_power),
+    clipped to [-top_db, 0]
+    Matches librosa.power_to_db(power, ref=np.max) and runs as one parallel
+    pass with Numba (or numexpr). Stays float32 throughout; pass out=power to
+    reuse the power buffer instead of allocating a new one
+    """
+    ref = np.float32(max(power.max() if ref_power is None else ref_power, AMIN_POWER))
+    amin = AMIN_POWER
+    if numba is not None and power.ndim == 2:
+        if out is None:
+            out = np.empty(power.shape, dtype=np.float32)
+        _power_to_db_kernel(power, amin, np.float32(10 * math.log10(ref)), np.float32(top_db), out)
+        return out
+    if ne is not None:
+        S_db = ne.evaluate('10 * log10(where(power > amin, power, amin) / ref)', out=out)
+    else:
+        S_db = np.maximum(power, amin, out=out)
+        S_db /= ref
+        np.log10(S_db, out=S_db)
+        S_db *= 10
+    
+    return np.clip(S_db, -top_db, 0.0, out=S_db)
+
+def _frequency_rows(n_rows, sr, options):
+    """Range of STFT rows covering options['fmin']..options['fmax']"""
+    n_fft = options['n_fft']
+    lo = max(0, int(options['fmin'] / sr * n_fft))
+    hi = min(n_rows, int(options['fmax'] / sr * n_fft) + 1)
+    return lo, hi
+
+@lru_cache(maxsize=None)
+def _colormap_lut(cmap):
+    """256-entry uint8 RGB table for a matplotlib colormap, built once per name"""
+    return plt.get_cmap(cmap, 256)(np.arange(256), bytes=True)[:, :3]
+
+def render_bare_spectrogram(S_db, sr, output_path, options):
+    """
+    Write a spectrogram as a plain colormapped PNG (no axes, title or colorbar)
+    
+    Args:
+        S_db (np.ndarray): Spectrogram in dB relative to its maximum
+        sr (int): Sample rate of the analysed audio
+        output_path (str): Path to output spectrogram image
+        options (dict): Generation options
+    """
+    # Crop rows to the requested frequency range
+    lo, hi = _frequency_rows(S_db.shape[0], sr, options)
+    S_db = S_db[lo:hi]
+    
+    # Map [-80, 0] dB onto [0, 1], low frequencies at the bottom
+    norm = np.clip(S_db[::-1], -80.0, 0.0, dtype=np.float32)
+    norm += np.float32(80.0)
+    norm /= np.float32(80.0)
+    
+    # Resize to the target image size, then look colors up in a 256-entry table
+    resized = Image.fromarray(norm, mode='F').resize(
+        (options['width'], options['height']), Image.BILINEAR
+    )
+    idx = np.clip(np.asarray(resized) * 256, 0, 255).astype(np.uint8)
+    lut = _colormap_lut(options['cmap'])
+    
+    Image.fromarray(lut[idx]).save(output_path, format='PNG', compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+
+def _verify_output(output_path):
+    """Verify the spectrogram file was created"""
+    if os.path.exists(output_path):
+        file_size = os.path.getsize(output_path)
+        log_info(f"Spectrogram saved successfully: {file_size} bytes")
+        return True
+    else:
+        raise ValueError("Failed to create output file")
+
+def _decimation_factor(sr, options):
+    """
+    Largest integer factor q that keeps sr / q above 2*fmax (with headroom) and
+    divides sr, n_fft and hop_length, so the decimated STFT keeps the same
+    window/hop durations and frame count with an n_fft q times smaller
+    """
+    min_sr = 2 * options['fmax'] * RESAMPLE_HEADROOM
+    if min_sr <= 0:
+        return 1
+    
+    for q in range(int(sr // min_sr), 1, -1):
+        if sr % q == 0 and options['n_fft'] % q == 0 and options['hop_length'] % q == 0:
+            return q
+    return 1
+
+def _downsample_for_fmax(y, sr, options):
+    """
+    Decimate y by an integer factor when the audio rate is well above 2*fmax,
+    dividing n_fft/hop_length by the same factor (e.g. 48 kHz -> 24 kHz with
+    n_fft 2048 -> 1024 for fmax=8000)
+    Everything above fmax would be cropped from the image anyway
+    """
+    q = _decimation_factor(sr, options)
+    if q == 1:
+        return y, sr, options
+    
+    target_sr = sr // q
+    y = soxr.resample(y, sr, target_sr, quality='HQ')
+    options = {
+        **options,
+        'n_fft': options['n_fft'] // q,
+        'hop_length': options['hop_length'] // q
+    }
+    return y, target_sr, options
+
+def render_spectrogram(y, sr, output_path, options, fig=None):
+    """
+    Render spectrogram of an already loaded audio signal
+    
+    Args:
+        y (np.ndarray): Audio time series
+        sr (int): Sample rate of the audio
+        output_path (str): Path to output spectrogram image
+        options (dict): Generation options
+        fig (matplotlib.figure.Figure): Figure to reuse; a new one is created if None
+    """
+    y, sr, options = _downsample_for_fmax(y, sr, options)
+    
+    # Extract features
+    power = stft_power(y, options['n_fft'], options['hop_length'])
+    
+    # dB reference from the displayed band only, so images come out the same
+    # whether or not the audio was decimated (which drops the band above fmax)
+    lo, hi = _frequency_rows(power.shape[0], sr, options)
+    S_db = power_to_db(power, out=power, ref_power=power[lo:hi].max() if hi > lo else None)
+    
+    return plot_spectrogram(S_db, sr, output_path, options, fig=fig)
+
+def plot_spectrogram(S_db, sr, output_path, options, fig=None):
+    """
+    Write a spectrogram image from a precomputed dB spectrogram
+    
+    Args:
+        S_db (np.ndarray): STFT magnitude in dB relative to its maximum
+        sr (int): Sample rate of the analysed audio
+        output_path (str): Path to output spectrogram image
+        options (dict): Generation options (n_fft/hop_length must match S_db)
+        fig (matplotlib.figure.Figure): Figure to reuse; a new one is created if None
+    """
+    if options.get('bare'):
+        log_info(f"Saving bare spectrogram to: {output_path}")
+        render_bare_spectrogram(S_db, sr, output_path, options)
+        return _verify_output(output_path)
+    
+    # Create figure with specified dimensions, or clear the reused one
+    owns_figure = fig is None
+    if owns_figure:
+        fig = plt.figure(figsize=(options['width']/100, options['height']/100), dpi=100)
+    else:
+        fig.clf()
+        fig.set_size_inches(options['width']/100, options['height']/100)
+    ax = fig.add_subplot()
+    
+    # Display spectrogram: a plain image of the rows in the frequency range,
+    # placed so each cell spans its frame and frequency bin (as specshow does)
+    lo, hi = _frequency_rows(S_db.shape[0], sr, options)
+    bin_hz = sr / options['n_fft']
+    duration = S_db.shape[1] * options['hop_length'] / sr
+    img = ax.imshow(
+        S_db[lo:hi],
+        aspect='auto',
+        origin='lower',
+        extent=(0, duration, (lo - 0.5) * bin_hz, (hi - 0.5) * bin_hz),
+        cmap=options['cmap'],
+        interpolation='nearest'
+    )
+    
+    # Customize appearance
+    ax.set_title('Audio Spectrogram', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Time (s)', fontsize=12)
+    ax.set_ylabel('Frequency (Hz)', fontsize=12)
+    
+    # Add colorbar
+    cbar = fig.colorbar(img, ax=ax, format='%+2.0f dB')
+    cbar.set_label('Intensity (dB)', fontsize=10)
+    
+    # Set frequency range
+    ax.set_ylim([options['fmin'], options['fmax']])
+    
+    # Grid and styling
+    ax.grid(True, alpha=0.3)
+    ax.set_facecolor('white')
+    
+    # Adjust layout
+    fig.tight_layout()
+    
+    # Save spectrogram
+    log_info(f"Saving spectrogram to: {output_path}")
+    fig.savefig(
+        output_path, 
+        dpi=100, 
+        bbox_inches='tight',
+        facecolor='white',
+        edgecolor='none',
+        pil_kwargs={'compress_level': PNG_COMPRESS_LEVEL}
+    )
+    
+    if owns_figure:
+        plt.close(fig)
+    
+    return _verify_output(output_path)
+
+def load_audio(audio_path, start_time=None, end_time=None):
+    """
+    Load audio file as mono float32 at its native sample rate
+    With start_time/end_time (seconds) only that region is read, starting at
+    sample int(start_time * sr)
+    """
+    log_info(f"Loading audio file: {audio_path}")
+    
+    y, sr = read_audio(audio_path, start_time, end_time)
+    
+    if len(y) == 0:
+        raise ValueError("Audio file is empty or corrupted")
+    
+    log_info(f"Audio loaded: {len(y)} samples, {sr} Hz sample rate")
+    return y, sr
 
 def generate_spectrogram(audio_path, output_path, options):
     """
@@ -24,85 +293,202 @@ def generate_spectrogram(audio_path, output_path, options):
         options (dict): Generation options
     """
     try:
-        print(f"[INFO] Loading audio file: {audio_path}")
-        
-        # Load audio file
-        y, sr = librosa.load(audio_path, sr=None)
-        
-        if len(y) == 0:
-            raise ValueError("Audio file is empty or corrupted")
-        
-        print(f"[INFO] Audio loaded: {len(y)} samples, {sr} Hz sample rate")
-        
-        # Extract features
-        D = librosa.stft(y, n_fft=options['n_fft'], hop_length=options['hop_length'])
-        S_db = librosa.amplitude_to_db(np.abs(D), ref=np.max)
-        
-        # Create figure with specified dimensions
-        fig, ax = plt.subplots(figsize=(options['width']/100, options['height']/100), dpi=100)
-        
-        # Display spectrogram
-        img = librosa.display.specshow(
-            S_db, 
-            sr=sr, 
-            hop_length=options['hop_length'],
-            x_axis='time', 
-            y_axis='hz',
-            cmap=options['cmap'],
-            fmin=options['fmin'],
-            fmax=options['fmax']
-        )
-        
-        # Customize appearance
-        ax.set_title('Audio Spectrogram', fontsize=14, fontweight='bold')
-        ax.set_xlabel('Time (s)', fontsize=12)
-        ax.set_ylabel('Frequency (Hz)', fontsize=12)
-        
-        # Add colorbar
-        cbar = plt.colorbar(img, ax=ax, format='%+2.0f dB')
-        cbar.set_label('Intensity (dB)', fontsize=10)
-        
-        # Set frequency range
-        ax.set_ylim([options['fmin'], options['fmax']])
-        
-        # Grid and styling
-        ax.grid(True, alpha=0.3)
-        ax.set_facecolor('white')
-        
-        # Adjust layout
-        plt.tight_layout()
-        
-        # Save spectrogram
-        print(f"[INFO] Saving spectrogram to: {output_path}")
-        plt.savefig(
-            output_path, 
-            dpi=100, 
-            bbox_inches='tight',
-            facecolor='white',
-            edgecolor='none'
-        )
-        
-        plt.close()
-        
-        # Verify file was created
-        if os.path.exists(output_path):
-            file_size = os.path.getsize(output_path)
-            print(f"[INFO] Spectrogram saved successfully: {file_size} bytes")
-            return True
-        else:
-            raise ValueError("Failed to create output file")
+        y, sr = load_audio(audio_path)
+        return render_spectrogram(y, sr, output_path, options)
             
     except Exception as e:
         print(f"[ERROR] Spectrogram generation failed: {str(e)}")
         return False
 
+def _slice_audio(y, sr, options, offset=0):
+    """
+    Slice audio to the optional start_time/end_time (seconds) in options
+    offset is the file sample at which y starts
+    """
+    start = options.get('start_time')
+    end = options.get('end_time')
+    if start is None and end is None:
+        return y
+    
+    start_sample = int((start or 0) * sr) - offset
+    end_sample = int(end * sr) - offset if end is not None else len(y)
+    return y[start_sample:end_sample]
+
+def _job_time_range(jobs):
+    """
+    Smallest (start_time, end_time) covering every job's slice; None stands
+    for the start/end of the file
+    """
+    starts = [job['options'].get('start_time') for job in jobs]
+    ends = [job['options'].get('end_time') for job in jobs]
+    start = None if None in starts else min(starts)
+    end = None if None in ends else max(ends)
+    return start, end
+
+def _process_audio_jobs(audio_path, jobs):
+    """
+    Generate all spectrograms for one source audio file
+    The audio (or just the span the jobs cover) is loaded once and a single
+    figure is reused across jobs
+    
+    Returns:
+        list: Success flag per job, in input order
+    """
+    # Only decode the part of the file the jobs need
+    start_time, end_time = _job_time_range(jobs)
+    try:
+        y, sr = load_audio(audio_path, start_time, end_time)
+    except Exception as e:
+        print(f"[ERROR] Spectrogram generation failed: {str(e)}")
+        return [False] * len(jobs)
+    offset = int((start_time or 0) * sr)
+    
+    fig = plt.figure()
+    results = []
+    try:
+        for job in jobs:
+            try:
+                y_job = _slice_audio(y, sr, job['options'], offset)
+                if len(y_job) == 0:
+                    raise ValueError("Requested audio slice is empty")
+                results.append(render_spectrogram(y_job, sr, job['output'], job['options'], fig=fig))
+            except Exception as e:
+                print(f"[ERROR] Spectrogram generation failed: {str(e)}")
+                results.append(False)
+    finally:
+        plt.close(fig)
+    
+    return results
+
+def _validate_job(job):
+    """Return why a {audio, output, options} job is invalid, or None if it is valid"""
+    if not isinstance(job, dict) or not job.get('audio') or not job.get('output'):
+        return "job needs 'audio' and 'output'"
+    if not os.path.exists(job['audio']):
+        return f"audio file not found: {job['audio']}"
+    
+    options = job.get('options', {})
+    if not isinstance(options, dict):
+        return "'options' must be an object"
+    
+    start = options.get('start_time')
+    end = options.get('end_time')
+    for name, value in (('start_time', start), ('end_time', end)):
+        if value is not None and (not isinstance(value, (int, float)) or value < 0):
+            return f"'{name}' must be a non-negative number of seconds"
+    if start is not None and end is not None and end <= start:
+        return "'end_time' must be after 'start_time'"
+    
+    return None
+
+def _pool_context():
+    """
+    Multiprocessing context for the job pool
+    Workers must not be forked from this process: once the parallel Numba
+    kernel has run, its TBB thread pool is live and a forked child deadlocks
+    it (the --server process then hangs at exit). With forkserver, workers are
+    forked from a clean server process that has only imported this module;
+    where it is unavailable (Windows) they are spawned
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('spawn')
+    
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload([__name__])
+    return context
+
+def process_jobs(jobs, base_options):
+    """
+    Generate spectrograms for a list of {audio, output, options} jobs
+    Jobs are grouped by source audio file so each file is decoded once,
+    and groups are spread across CPU cores
+    
+    Args:
+        jobs (list): Job dicts; per-job options override base_options
+        base_options (dict): Default generation options
+    
+    Returns:
+        list: Success flag per job, in input order
+    """
+    # Reject malformed jobs before any audio is decoded
+    groups = {}
+    rejected = 0
+    for index, job in enumerate(jobs):
+        error = _validate_job(job)
+        if error:
+            print(f"[ERROR] Skipping job {index}: {error}")
+            rejected += 1
+            continue
+        
+        output_dir = os.path.dirname(job['output'])
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        
+        prepared = {
+            'output': job['output'],
+            'options': {**base_options, **job.get('options', {})}
+        }
+        groups.setdefault(job['audio'], []).append((index, prepared))
+    
+    if rejected:
+        print(f"[ERROR] Rejected {rejected}/{len(jobs)} invalid jobs")
+    
+    results = [False] * len(jobs)
+    audio_paths = list(groups)
+    if not audio_paths:
+        return results
+    
+    job_lists = [[job for _, job in groups[audio_path]] for audio_path in audio_paths]
+    
+    if len(audio_paths) == 1:
+        group_results = [_process_audio_jobs(audio_paths[0], job_lists[0])]
+    else:
+        max_workers = min(os.cpu_count() or 1, len(audio_paths))
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_pool_context(),
+                                 initializer=set_fft_workers, initargs=(1,)) as executor:
+            group_results = list(executor.map(_process_audio_jobs, audio_paths, job_lists))
+    
+    for audio_path, flags in zip(audio_paths, group_results):
+        for (index, _), success in zip(groups[audio_path], flags):
+            results[index] = success
+    
+    return results
+
+def serve(base_options):
+    """
+    Serve spectrogram requests over stdin/stdout from one long-running process
+    Each stdin line is a single {"audio", "output", "options"} job or
+    {"jobs": [...]}; each stdout line is {"success": ..., "results": [...]}
+    with one flag per job. Progress logging goes to stderr.
+    """
+    output = sys.stdout
+    with redirect_stdout(sys.stderr):
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            
+            try:
+                request = json.loads(line)
+                jobs = request['jobs'] if 'jobs' in request else [request]
+                results = process_jobs(jobs, base_options)
+                result = {'success': all(results), 'results': results}
+            except Exception as e:
+                print(f"[ERROR] Spectrogram generation failed: {str(e)}")
+                result = {'success': False, 'error': str(e)}
+            
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+
 def main():
     """Main function to handle command line arguments and generate spectrogram"""
     parser = argparse.ArgumentParser(description='Generate spectrogram from audio file')
     
-    # Required arguments
-    parser.add_argument('--audio', required=True, help='Path to input audio file')
-    parser.add_argument('--output', required=True, help='Path to output spectrogram image')
+    # Input/output arguments (--audio/--output, --jobs or --server is required)
+    parser.add_argument('--audio', help='Path to input audio file')
+    parser.add_argument('--output', help='Path to output spectrogram image')
+    parser.add_argument('--jobs', help='Path to JSON file containing a list of {audio, output, options} jobs')
+    parser.add_argument('--server', action='store_true', help='Serve line-delimited JSON job requests from stdin')
     
     # Optional arguments with defaults
     parser.add_argument('--width', type=int, default=1000, help='Image width in pixels')
@@ -112,18 +498,12 @@ def main():
     parser.add_argument('--n_fft', type=int, default=2048, help='FFT window size')
     parser.add_argument('--hop_length', type=int, default=512, help='Hop length for STFT')
     parser.add_argument('--cmap', default='viridis', help='Matplotlib colormap')
+    parser.add_argument('--bare', action='store_true', help='Write only the colormapped spectrogram (no axes, title or colorbar)')
     
     args = parser.parse_args()
     
-    # Validate input file
-    if not os.path.exists(args.audio):
-        print(f"[ERROR] Input audio file not found: {args.audio}")
-        sys.exit(1)
-    
-    # Create output directory if it doesn't exist
-    output_dir = os.path.dirname(args.output)
-    if output_dir and not os.path.exists(output_dir):
-        os.makedirs(output_dir, exist_ok=True)
+    if not (args.server or args.jobs) and not (args.audio and args.output):
+        parser.error('either --server, --jobs or both --audio and --output are required')
     
     # Prepare options
     options = {
@@ -133,13 +513,43 @@ def main():
         'fmax': args.fmax,
         'n_fft': args.n_fft,
         'hop_length': args.hop_length,
-        'cmap': args.cmap
+        'cmap': args.cmap,
+        'bare': args.bare
     }
     
-    print(f"[INFO] Starting spectrogram generation...")
-    print(f"[INFO] Input: {args.audio}")
-    print(f"[INFO] Output: {args.output}")
-    print(f"[INFO] Options: {options}")
+    if args.server:
+        serve(options)
+        sys.exit(0)
+    
+    if args.jobs:
+        with open(args.jobs, 'r') as f:
+            jobs = json.load(f)
+        
+        log_info(f"Starting batch spectrogram generation for {len(jobs)} jobs...")
+        results = process_jobs(jobs, options)
+        succeeded = sum(results)
+        
+        if succeeded == len(jobs):
+            print(f"[SUCCESS] Generated {succeeded}/{len(jobs)} spectrograms")
+            sys.exit(0)
+        else:
+            print(f"[ERROR] Generated {succeeded}/{len(jobs)} spectrograms")
+            sys.exit(1)
+    
+    # Validate input file
+    if not os.path.exists(args.audio):
+        print(f"[ERROR] Input audio file not found: {args.audio}")
+        sys.exit(1)
+    
+    # Create output directory if it doesn't exist
+    output_dir = os.path.dirname(args.output)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+    
+    log_info("Starting spectrogram generation...")
+    log_info(f"Input: {args.audio}")
+    log_info(f"Output: {args.output}")
+    log_info(f"Options: {options}")
     
     # Generate spectrogram
     success = generate_spectrogram(args.audio, args.output, options)
@@ -123,6 +123,59 @@ export class AudioFeatureService {
     });
   }
 
+  /**
+   * Run Python script once to extract audio features for many files
+   * @param {Array<string>} audioPaths - Local audio file paths
+   * @returns {Promise<Array>} Features per path (null where extraction failed)
+   */
+  async runBatchFeatureExtraction(audioPaths) {
+    const listPath = path.join(this.tempDir, `audio_list_${Date.now()}.json`);
+    fs.writeFileSync(listPath, JSON.stringify(audioPaths));
+    
+    try {
+      return await new Promise((resolve, reject) => {
+        const pythonScript = path.join(process.cwd(), 'audio_feature_extractor.py');
+        
+        const pythonProcess = spawn('python', [
+          pythonScript,
+          '--audio-list', listPath,
+          '--output', 'stdout'
+        ]);
+        
+        let stdout = '';
+        let stderr = '';
+        
+        pythonProcess.stdout.on('data', (data) => {
+          stdout += data.toString();
+        });
+        
+        pythonProcess.stderr.on('data', (data) => {
+          stderr += data.toString();
+        });
+        
+        pythonProcess.on('close', (code) => {
+          if (code === 0) {
+            try {
+              // Parse features list from stdout
+              const results = JSON.parse(stdout.trim());
+              resolve(results);
+            } catch (parseError) {
+              reject(new Error(`Failed to parse features: ${parseError.message}`));
+            }
+          } else {
+            reject(new Error(`Batch feature extraction failed with code ${code}: ${stderr}`));
+          }
+        });
+        
+        pythonProcess.on('error', (error) => {
+          reject(error);
+        });
+      });
+    } finally {
+      this.cleanupTempFile(listPath);
+    }
+  }
+
   /**
    * Clean up temporary file
    */
@@ -144,27 +197,67 @@ export class AudioFeatureService {
    */
   async extractFeaturesForSnippets(snippets) {
     const features = [];
+    const downloaded = [];
     
+    // Download all snippets first so they can be processed in one Python run
     for (let i = 0; i < snippets.length; i++) {
       const snippet = snippets[i];
       try {
-        console.log(`🎵 Processing snippet ${i + 1}/${snippets.length}`);
-        
-        const extractedFeatures = await this.extractFeatures(snippet.s3_key);
+        console.log(`🎵 Downloading snippet ${i + 1}/${snippets.length}`);
         
-        features.push({
-          snippet_id: snippet.id,
-          event_id: snippet.event_id,
-          s3_key: snippet.s3_key,
-          features: extractedFeatures
-        });
+        const tempPath = await this.downloadSnippet(snippet.s3_key);
+        downloaded.push({ snippet, tempPath });
         
       } catch (error) {
-        console.error(`❌ Failed to extract features for snippet ${snippet.id}:`, error);
+        console.error(`❌ Failed to download snippet ${snippet.id}:`, error);
         // Continue with other snippets
       }
     }
     
+    if (downloaded.length === 0) {
+      return features;
+    }
+    
+    const addFeatures = (snippet, extractedFeatures) => {
+      features.push({
+        snippet_id: snippet.id,
+        event_id: snippet.event_id,
+        s3_key: snippet.s3_key,
+        features: extractedFeatures
+      });
+    };
+    
+    try {
+      console.log(`🎵 Extracting features for ${downloaded.length} snippets`);
+      
+      const results = await this.runBatchFeatureExtraction(downloaded.map(d => d.tempPath));
+      
+      downloaded.forEach(({ snippet }, i) => {
+        if (!results[i]) {
+          console.error(`❌ Failed to extract features for snippet ${snippet.id}`);
+          return;
+        }
+        
+        addFeatures(snippet, results[i]);
+      });
+      
+    } catch (error) {
+      console.error('❌ Batch feature extraction failed, retrying snippets one by one:', error);
+      
+      // Extract the snippets individually so one bad file doesn't lose them all
+      for (const { snippet, tempPath } of downloaded) {
+        try {
+          addFeatures(snippet, await this.runFeatureExtraction(tempPath));
+        } catch (snippetError) {
+          console.error(`❌ Failed to extract features for snippet ${snippet.id}:`, snippetError);
+          // Continue with other snippets
+        }
+      }
+      
+    } finally {
+      downloaded.forEach(({ tempPath }) => this.cleanupTempFile(tempPath));
+    }
+    
     return features;
   }
 }
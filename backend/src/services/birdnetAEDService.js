@@ -6,6 +6,129 @@ import path from 'path';
 import { spawn } from 'child_process';
 import { v4 as uuidv4 } from 'uuid';
 
+// Longest a single BirdNet request may run before the worker is restarted
+const BIRDNET_REQUEST_TIMEOUT_MS = Number(process.env.BIRDNET_REQUEST_TIMEOUT_MS) || 10 * 60 * 1000;
+
+/**
+ * Long-lived BirdNet Python worker
+ * Keeps a single Analyzer (and its TFLite model) loaded and serves requests
+ * as line-delimited JSON over stdin/stdout, answered in order
+ */
+class BirdNetWorker {
+  constructor(scriptPath) {
+    this.scriptPath = scriptPath;
+    this.process = null;
+    this.pending = [];
+    this.buffer = '';
+    this.timer = null;
+  }
+
+  start() {
+    const pythonProcess = spawn('python', [this.scriptPath, '--server']);
+    this.process = pythonProcess;
+    this.buffer = '';
+
+    pythonProcess.stdout.on('data', (data) => {
+      // Ignore output from a worker that has already been replaced
+      if (this.process !== pythonProcess) return;
+      this.buffer += data.toString();
+      
+      let newline;
+      while ((newline = this.buffer.indexOf('\n')) !== -1) {
+        const line = this.buffer.slice(0, newline).trim();
+        this.buffer = this.buffer.slice(newline + 1);
+        if (!line) continue;
+        
+        const request = this.pending.shift();
+        if (!request) continue;
+        this.armTimeout();
+        
+        try {
+          const result = JSON.parse(line);
+          if (result.success) {
+            request.resolve(result.detections);
+          } else {
+            request.reject(new Error(result.error));
+          }
+        } catch (parseError) {
+          request.reject(new Error(`Failed to parse BirdNet result: ${parseError.message}`));
+        }
+      }
+    });
+
+    pythonProcess.stderr.on('data', (data) => {
+      console.log(`🐍 Python: ${data.toString().trim()}`);
+    });
+
+    const failPending = (error) => this.fail(pythonProcess, error);
+
+    pythonProcess.on('close', (code) => {
+      console.error(`❌ BirdNet worker exited with code ${code}`);
+      failPending(new Error(`BirdNet worker exited with code ${code}`));
+    });
+
+    pythonProcess.on('error', (error) => {
+      console.error('❌ Failed to start Python process:', error);
+      failPending(new Error(`Failed to start BirdNet analysis: ${error.message}`));
+    });
+
+    // Writing to a worker that has died raises EPIPE on stdin
+    pythonProcess.stdin.on('error', failPending);
+  }
+
+  /**
+   * Reject every pending request and drop the worker so the next
+   * analyze() starts a fresh one. No-op for a worker already replaced
+   */
+  fail(pythonProcess, error) {
+    if (this.process !== pythonProcess) return;
+    this.process = null;
+    clearTimeout(this.timer);
+    this.timer = null;
+    pythonProcess.kill();
+    
+    const pending = this.pending;
+    this.pending = [];
+    pending.forEach(request => request.reject(error));
+  }
+
+  /**
+   * (Re)start the timeout for the request at the head of the queue
+   * Requests are answered in order, so only the head one is running
+   */
+  armTimeout() {
+    clearTimeout(this.timer);
+    this.timer = null;
+    if (this.pending.length === 0) return;
+    
+    const pythonProcess = this.process;
+    this.timer = setTimeout(() => {
+      console.error(`❌ BirdNet request timed out after ${BIRDNET_REQUEST_TIMEOUT_MS} ms, restarting worker`);
+      this.fail(pythonProcess, new Error(`BirdNet analysis timed out after ${BIRDNET_REQUEST_TIMEOUT_MS} ms`));
+    }, BIRDNET_REQUEST_TIMEOUT_MS);
+  }
+
+  analyze(audioPath, latitude, longitude) {
+    if (!this.process) {
+      this.start();
+    }
+    
+    return new Promise((resolve, reject) => {
+      this.pending.push({ resolve, reject });
+      if (this.pending.length === 1) {
+        this.armTimeout();
+      }
+      this.process.stdin.write(JSON.stringify({
+        audio: audioPath,
+        lat: latitude,
+        lon: longitude
+      }) + '\n');
+    });
+  }
+}
+
+const birdnetWorker = new BirdNetWorker(path.join(process.cwd(), 'birdnet_analyzer.py'));
+
 /**
  * BirdNet AED Service
  * Analyzes audio recordings using BirdNet with location-specific species lists
@@ -170,91 +293,20 @@ export class BirdNetAEDService {
       console.log(`🎯 Analyzing audio file: ${audioPath}`);
       console.log(`📍 Location: ${latitude}, ${longitude}`);
       
-      // Run Python BirdNet script
-      const pythonScript = path.join(process.cwd(), 'birdnet_analyzer.py');
+      console.log("🔍 Running BirdNet analysis via persistent Python worker...");
+      progressCallback(50, 'Running BirdNet analysis...');
       
-      console.log("🔍 Running BirdNet analysis via Python script...");
+      const detections = await birdnetWorker.analyze(audioPath, latitude, longitude);
       
-      return new Promise((resolve, reject) => {
-        const pythonProcess = spawn('python', [
-          pythonScript,
-          '--audio', audioPath,
-          '--lat', latitude.toString(),
-          '--lon', longitude.toString(),
-          '--output', 'stdout'  // Changed to stdout
-        ]);
-        
-        let stdout = '';
-        let stderr = '';
-        let detections = [];
-        let inResults = false;
-        
-        pythonProcess.stdout.on('data', (data) => {
-          const output = data.toString();
-          stdout += output;
-          console.log(`🐍 Python: ${output.trim()}`);
-          
-          // Update progress based on Python output
-          if (output.includes('[INFO] Initializing BirdNet Analyzer')) {
-            progressCallback(45, 'Initializing BirdNet...');
-          } else if (output.includes('[INFO] Running BirdNet analysis')) {
-            progressCallback(50, 'Running BirdNet analysis...');
-          } else if (output.includes('[SUCCESS] Found') && output.includes('detections')) {
-            const match = output.match(/Found (\d+) detections/);
-            if (match) {
-              const count = parseInt(match[1]);
-              progressCallback(60, `Found ${count} detections`);
-            }
-          }
-          
-          // Parse detection results from stdout
-          const lines = output.split('\n');
-          for (const line of lines) {
-            if (line.includes('[RESULTS_START]')) {
-              inResults = true;
-              detections = [];
-            } else if (line.includes('[RESULTS_END]')) {
-              inResults = false;
-            } else if (inResults && line.includes('[DETECTION]')) {
-              try {
-                const detectionJson = line.replace('[DETECTION] ', '');
-                const detection = JSON.parse(detectionJson);
-                detections.push(detection);
-              } catch (parseError) {
-                console.warn('Failed to parse detection line:', line);
-              }
-            }
-          }
-        });
-        
-        pythonProcess.stderr.on('data', (data) => {
-          const error = data.toString();
-          stderr += error;
-          console.error(`🐍 Python Error: ${error.trim()}`);
-        });
-        
-        pythonProcess.on('close', (code) => {
-          if (code === 0) {
-            if (detections.length > 0) {
-              console.log(`✅ BirdNet analysis complete! Found ${detections.length} detections`);
-              progressCallback(65, `Processing ${detections.length} detections`);
-              resolve(detections);
-            } else {
-              reject(new Error('No detections found in BirdNet analysis'));
-            }
-          } else {
-            console.error(`❌ Python script failed with code ${code}`);
-            console.error(`STDOUT: ${stdout}`);
-            console.error(`STDERR: ${stderr}`);
-            reject(new Error(`BirdNet analysis failed with exit code ${code}`));
-          }
-        });
-        
-        pythonProcess.on('error', (error) => {
-          console.error('❌ Failed to start Python process:', error);
-          reject(new Error(`Failed to start BirdNet analysis: ${error.message}`));
-        });
-      });
+      progressCallback(60, `Found ${detections.length} detections`);
+      
+      if (detections.length === 0) {
+        throw new Error('No detections found in BirdNet analysis');
+      }
+      
+      console.log(`✅ BirdNet analysis complete! Found ${detections.length} detections`);
+      progressCallback(65, `Processing ${detections.length} detections`);
+      return detections;
 
     } catch (error) {
       console.error('❌ BirdNet analysis error:', error);
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Numba Warm-up Script
+Runs tiny clustering fits so Numba's on-disk cache is populated before the
+first real job (run with: npm run warmup-numba)
+"""
+
+import sys
+import time
+import numpy as np
+
+# Importing audio_clustering applies its NUMBA_CACHE_DIR/NUMBA_NUM_THREADS defaults
+import audio_clustering
+
+def warm(name, func):
+    """Run one warm-up step, reporting but never raising errors"""
+    start = time.time()
+    try:
+        func()
+        print(f"[INFO] Warmed up {name} in {time.time() - start:.1f}s")
+    except Exception as e:
+        print(f"[WARNING] Could not warm up {name}: {e}")
+
+def main():
+    rng = np.random.default_rng(0)
+    X_small = rng.random((20, 3), dtype=np.float32)
+    X_large = rng.random((audio_clustering.UMAP_PARALLEL_MIN_POINTS, 3), dtype=np.float32)
+    
+    print(f"[INFO] Numba cache directory: {audio_clustering.os.environ['NUMBA_CACHE_DIR']}")
+    
+    if audio_clustering.numba is not None:
+        D = np.empty((len(X_small), len(X_small)), dtype=np.float64)
+        warm('pairwise distances', lambda: audio_clustering.pairwise_euclidean(X_small, D))
+    
+    if audio_clustering.fast_hdbscan is not None:
+        warm('fast_hdbscan', lambda: audio_clustering.fast_hdbscan.HDBSCAN(min_cluster_size=3).fit_predict(X_large))
+    
+    warm('UMAP (seeded)', lambda: audio_clustering.umap_embedding(X_small))
+    warm('UMAP (parallel)', lambda: audio_clustering.umap_embedding(X_large))
+    
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()